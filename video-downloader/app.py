@@ -1,16 +1,25 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, redirect, Response, stream_with_context
 from flask_cors import CORS
-import yt_dlp
 import os
 import tempfile
 import uuid
 from pathlib import Path
 import shutil
 import re
-from urllib.parse import urlparse, urljoin
-import requests
-from bs4 import BeautifulSoup
+import time
+import bisect
+import hashlib
+import importlib
+import hmac
+import sqlite3
+from collections import namedtuple
+from contextlib import closing
+from functools import lru_cache
+from urllib.parse import urlparse, urljoin, parse_qs, urlencode
+import threading
 import json
+# yt_dlp, requests и bs4 импортируются лениво внутри функций:
+# на них приходится большая часть времени холодного старта
 
 app = Flask(__name__)
 CORS(app)
@@ -19,69 +28,244 @@ CORS(app)
 TEMP_DIR = Path(tempfile.gettempdir()) / 'video_downloader'
 TEMP_DIR.mkdir(exist_ok=True)
 
-def detect_platform(url: str) -> str:
-    """Определяет платформу по URL"""
-    url_lower = url.lower()
-    if 'youtube.com' in url_lower or 'youtu.be' in url_lower:
-        return 'youtube'
-    elif 'tiktok.com' in url_lower:
-        return 'tiktok'
-    elif 'instagram.com' in url_lower:
-        return 'instagram'
-    return 'unknown'
-
-def is_profile_url(url: str) -> bool:
-    """Определяет, является ли URL ссылкой на профиль/канал, а не на конкретное видео"""
-    url_lower = url.lower()
+# Размер LRU-кэша разбора URL и кэша раскрытых коротких ссылок
+URL_CACHE_SIZE = int(os.environ.get('URL_CACHE_SIZE', 4096))
+# Сколько секунд помним, куда ведет короткая ссылка (vm.tiktok.com и т.п.)
+SHORT_LINK_TTL = int(os.environ.get('SHORT_LINK_TTL', 3600))
+
+# Фоновый прогрев yt-dlp и экстракторов поддерживаемых платформ при старте (0 - отключить)
+PREWARM_EXTRACTORS = os.environ.get('PREWARM_EXTRACTORS', '1') != '0'
+PREWARM_IE_KEYS = ('Youtube', 'TikTok', 'Instagram')
+PREWARM_MODULES = ('requests', 'bs4', 'yt_dlp')
+
+# Многоузловой режим (включается, если задан CLUSTER_NODES):
+# CLUSTER_NODES - базовые URL всех узлов через запятую (http://dl-1:5000,http://dl-2:5000)
+# NODE_URL - адрес этого узла, как он указан в CLUSTER_NODES
+# CLUSTER_STORE - redis://... или путь к SQLite-файлу на общем для всех узлов томе (обязателен)
+# CLUSTER_FILE_MODE - proxy (отдаем файл через себя, работает за балансировщиком)
+#                     или redirect (307 на адрес узла из CLUSTER_NODES - только если клиенты его видят)
+# CLUSTER_SECRET - общий секрет узлов; без него пересланным считается любой запрос с адресом узла в заголовке
+CLUSTER_NODES = [node.strip().rstrip('/') for node in os.environ.get('CLUSTER_NODES', '').split(',') if node.strip()]
+NODE_URL = os.environ.get('NODE_URL', '').rstrip('/')
+CLUSTER_STORE = os.environ.get('CLUSTER_STORE', '')
+CLUSTER_SECRET = os.environ.get('CLUSTER_SECRET', '')
+CLUSTER_FILE_MODE = os.environ.get('CLUSTER_FILE_MODE', 'proxy')
+CLUSTER_JOB_TIMEOUT = int(os.environ.get('CLUSTER_JOB_TIMEOUT', 600))  # Максимальное время одной задачи
+CLUSTER_RESULT_TTL = int(os.environ.get('CLUSTER_RESULT_TTL', 24 * 3600))  # Сколько помним скачанные файлы
+CLUSTER_FAILURE_TTL = 30  # Сколько ожидающие запросы видят ошибку, прежде чем пробовать снова
+CLUSTER_POLL_INTERVAL = 1.0
+# Скачанные файлы, общие для всех запросов одного видео. Каждый запрос получает свою жесткую ссылку
+# в TEMP_DIR и может удалить ее после обработки; сами артефакты удаляются по CLUSTER_RESULT_TTL
+ARTIFACT_DIR = TEMP_DIR / 'artifacts'
+CLUSTER_ENABLED = bool(CLUSTER_NODES)
+# Заголовки, которыми узлы помечают пересланные друг другу запросы (защита от циклов)
+FORWARDED_HEADER = 'X-Downloader-Forwarded-By'
+SECRET_HEADER = 'X-Downloader-Cluster-Secret'
+
+if CLUSTER_ENABLED and NODE_URL not in CLUSTER_NODES:
+    raise RuntimeError(f'NODE_URL ({NODE_URL or "not set"}) must be one of CLUSTER_NODES: {", ".join(CLUSTER_NODES)}')
+if CLUSTER_ENABLED and not CLUSTER_STORE:
+    # Локальный реестр у каждого узла молча отключил бы дедупликацию и поиск файлов на других узлах
+    raise RuntimeError('CLUSTER_STORE must be set when CLUSTER_NODES is set (redis://... or a SQLite path on a shared volume)')
+
+# Результат разбора URL. kind: 'video', 'profile', 'playlist' или 'unknown'.
+# (platform, canonical_id) - стабильный ключ для кэшей и дедупликации:
+# youtu.be/ID, youtube.com/watch?v=ID&si=... и /shorts/ID дают один и тот же ключ
+ResolvedUrl = namedtuple('ResolvedUrl', ['platform', 'kind', 'canonical_id', 'canonical_url'])
+
+_HOST_RE = re.compile(r'(?:^|\.)(youtube\.com|youtube-nocookie\.com|youtu\.be|tiktok\.com|instagram\.com)$')
+_HOST_PLATFORMS = {
+    'youtube.com': 'youtube',
+    'youtube-nocookie.com': 'youtube',
+    'youtu.be': 'youtube',
+    'tiktok.com': 'tiktok',
+    'instagram.com': 'instagram',
+}
+
+# Короткие ссылки, которые раскрываются только через HTTP-редирект
+_SHORT_LINK_HOSTS = ('vm.tiktok.com', 'vt.tiktok.com')
+_SHORT_LINK_PATH_RE = re.compile(r'^/(?:t/[\w-]+|share/(?:reel/|p/)?[\w-]+)/?$')
+
+_YT_ID = r'(?P<id>[\w-]{11})'
+# Вкладки канала, которые являются списками видео того же профиля
+_YT_LISTING_TABS = r'(?:videos|streams|playlists|featured|podcasts|releases)'
+
+def _youtube_video(m, query):
+    video_id = m.group('id')
+    return video_id, f"https://www.youtube.com/watch?v={video_id}"
+
+def _youtube_watch(m, query):
+    video_id = query.get('v', [''])[0]
+    if not re.fullmatch(r'[\w-]{11}', video_id):
+        return None
+    return video_id, f"https://www.youtube.com/watch?v={video_id}"
+
+def _youtube_channel(m, query):
+    channel = m.group('channel')
+    if channel.startswith('@'):
+        channel = channel.lower()
+    else:
+        # ID канала регистрозависим, префикс c/channel/user - нет
+        prefix, name = channel.split('/', 1)
+        channel = f"{prefix.lower()}/{name}"
+    if m.group('shorts'):
+        channel += '/shorts'
+    return channel, f"https://www.youtube.com/{channel}"
+
+def _youtube_playlist(m, query):
+    playlist_id = query.get('list', [''])[0]
+    if not playlist_id:
+        return None
+    return playlist_id, f"https://www.youtube.com/playlist?list={playlist_id}"
+
+def _tiktok_video(m, query):
+    video_id = m.group('id')
+    user = (m.groupdict().get('user') or '').lower()
+    # Сегмент video/photo сохраняем: фото-посты нельзя отдавать экстрактору видео.
+    # Пустой @ без имени пользователя TikTokIE тоже принимает, а /video/ID без @ - нет
+    kind = (m.groupdict().get('kind') or 'video').lower()
+    return video_id, f"https://www.tiktok.com/@{user}/{kind}/{video_id}"
+
+def _tiktok_profile(m, query):
+    user = '@' + m.group('user').lower()
+    return user, f"https://www.tiktok.com/{user}"
+
+def _instagram_post(m, query):
+    shortcode = m.group('id')
+    return shortcode, f"https://www.instagram.com/p/{shortcode}/"
+
+def _instagram_profile(m, query):
+    user = m.group('user').lower()
+    return user, f"https://www.instagram.com/{user}/"
+
+# Таблица маршрутов: платформа -> [(регулярка по пути, тип, построитель канонического вида)].
+# Порядок важен: первый совпавший маршрут выигрывает. Служебные части пути (watch, shorts, reel...)
+# сравниваются без учета регистра, а ID видео берутся как есть - они регистрозависимы
+_ROUTES = {
+    'youtube': [
+        (re.compile(r'^/watch/?$', re.I), 'video', _youtube_watch),
+        (re.compile(rf'^/(?:@[^/]+/)?(?:shorts|embed|live|v|e)/{_YT_ID}/?$', re.I), 'video', _youtube_video),
+        (re.compile(r'^/playlist/?$', re.I), 'playlist', _youtube_playlist),
+        # Только вкладки со списками видео; /live, /about и т.п. остаются unknown и уходят в yt-dlp как есть
+        (re.compile(rf'^/(?P<channel>@[^/]+)(?:/(?P<shorts>shorts)|/{_YT_LISTING_TABS})?/?$', re.I), 'profile', _youtube_channel),
+        (re.compile(rf'^/(?P<channel>(?:c|channel|user)/[^/]+)(?:/(?P<shorts>shorts)|/{_YT_LISTING_TABS})?/?$', re.I),
+         'profile', _youtube_channel),
+    ],
+    'youtu.be': [
+        (re.compile(rf'^/{_YT_ID}/?$'), 'video', _youtube_video),
+    ],
+    'tiktok': [
+        (re.compile(r'^/(?:@(?P<user>[^/]*)/)?(?P<kind>video|photo)/(?P<id>\d+)/?$', re.I), 'video', _tiktok_video),
+        (re.compile(r'^/v/(?P<id>\d+)(?:\.html)?/?$', re.I), 'video', _tiktok_video),
+        # Только сам профиль: /@user/live и прочее остаются unknown
+        (re.compile(r'^/@(?P<user>[^/]+)/?$'), 'profile', _tiktok_profile),
+    ],
+    'instagram': [
+        (re.compile(r'^/(?:[^/]+/)?(?:p|reels?|tv)/(?P<id>[\w-]+)/?$', re.I), 'video', _instagram_post),
+        # Профиль, в том числе вкладки /username/reels/ и /username/tagged/
+        (re.compile(r'^/(?!(?:p|reels?|tv|stories|explore|accounts|direct|share)(?:/|$))(?P<user>[\w.]+)(?:/(?:reels|tagged))?/?$', re.I),
+         'profile', _instagram_profile),
+    ],
+}
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def _route(url: str) -> ResolvedUrl:
+    """Разбирает URL по таблице маршрутов без сетевых запросов"""
+    url = url.strip()
+    if '://' not in url:
+        url = 'https://' + url
     parsed = urlparse(url)
-    pathname = parsed.path.lower()
-    
-    # YouTube: канал, профиль или shorts плейлист
-    if 'youtube.com/@' in url_lower:
-        # Если путь заканчивается на /shorts или /@username/shorts - это плейлист shorts (профиль)
-        if '/shorts' in pathname:
-            # Проверяем, не является ли это конкретным видео (есть ID после /shorts/)
-            if re.match(r'^/@[^/]+/shorts/[a-zA-Z0-9_-]+$', pathname):
-                return False  # Это конкретное видео
-            # Если путь заканчивается на /shorts или /@username/shorts - это плейлист (профиль)
-            if pathname.endswith('/shorts') or pathname.endswith('/shorts/'):
-                return True  # Это плейлист shorts профиля
-        # Если есть /@username без /watch или /shorts/ID - это профиль
-        if re.match(r'^/@[^/]+$', pathname) or re.match(r'^/@[^/]+/shorts/?$', pathname):
-            return True
-        # Если нет /watch и не конкретное видео - это профиль
-        if '/watch' not in pathname and not re.match(r'/shorts/[a-zA-Z0-9_-]+$', pathname):
-            return True
-    if ('youtube.com/c/' in url_lower or 
-        'youtube.com/channel/' in url_lower or
-        'youtube.com/user/' in url_lower or
-        'youtube.com/playlist' in url_lower):
-        return True
-    
-    # TikTok: профиль (без /video/)
-    if 'tiktok.com/@' in url_lower:
-        # Если путь заканчивается на /@username или /@username/ - это профиль
-        if re.match(r'^/@[^/]+/?$', pathname) or pathname == '/':
-            return True
-        # Если нет /video/ - это профиль
-        if '/video/' not in pathname:
-            return True
-    
-    # Instagram: профиль (без /p/, /reel/, /tv/)
-    if 'instagram.com/' in url_lower:
-        # Если путь заканчивается на /username или /username/ - это профиль
-        if re.match(r'^/[^/]+/?$', pathname) and pathname != '/':
-            # Проверяем, что это не конкретный пост/рилс
-            if ('/p/' not in pathname and 
-                '/reel/' not in pathname and 
-                '/tv/' not in pathname and
-                '/stories/' not in pathname):
-                return True
-    
-    return False
+    host = (parsed.hostname or '').lower()
+    host_match = _HOST_RE.search(host)
+    if not host_match:
+        return ResolvedUrl('unknown', 'unknown', None, url)
+
+    domain = host_match.group(1)
+    platform = _HOST_PLATFORMS[domain]
+    path = parsed.path or '/'
+
+    if host in _SHORT_LINK_HOSTS or (domain != 'youtu.be' and _SHORT_LINK_PATH_RE.match(path)):
+        return ResolvedUrl(platform, 'shortlink', f"{host}{path.rstrip('/')}", url)
+
+    query = parse_qs(parsed.query)
+    for pattern, kind, build in _ROUTES['youtu.be' if domain == 'youtu.be' else platform]:
+        m = pattern.match(path)
+        if not m:
+            continue
+        canonical = build(m, query)
+        if canonical:
+            return ResolvedUrl(platform, kind, canonical[0], canonical[1])
+
+    # Платформа известна, но тип ссылки не распознан - отдаем как есть
+    return ResolvedUrl(platform, 'unknown', None, url)
+
+def _follow_short_link(url: str) -> str:
+    """Раскрывает короткую ссылку (vm.tiktok.com, /share/...) через HTTP-редирект"""
+    import requests
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    }
+    try:
+        response = requests.head(url, allow_redirects=True, timeout=10, headers=headers)
+        response.raise_for_status()
+        return response.url
+    except requests.exceptions.RequestException as e:
+        # TikTok часто отклоняет HEAD - повторяем через GET, не читая тело ответа
+        print(f"HEAD failed for short link {url}, retrying with GET: {e}")
+    with closing(requests.get(url, allow_redirects=True, timeout=10, headers=headers, stream=True)) as response:
+        return response.url
+
+# Раскрытые короткие ссылки: короткий URL -> (срок годности, ResolvedUrl). Ошибки не кэшируются
+_short_links = {}
+_short_links_lock = threading.Lock()
+
+def resolve_url(url: str) -> ResolvedUrl:
+    """Определяет платформу, тип ссылки и канонический вид URL (с раскрытием коротких ссылок)"""
+    resolved = _route(url)
+    if resolved.kind != 'shortlink':
+        return resolved
+
+    now = time.monotonic()
+    with _short_links_lock:
+        cached = _short_links.get(resolved.canonical_url)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    try:
+        target = _route(_follow_short_link(resolved.canonical_url))
+        if target.kind not in ('shortlink', 'unknown'):
+            with _short_links_lock:
+                _short_links.pop(resolved.canonical_url, None)
+                if len(_short_links) >= URL_CACHE_SIZE:
+                    # Вытесняем самую старую запись (dict хранит порядок вставки)
+                    _short_links.pop(next(iter(_short_links)))
+                _short_links[resolved.canonical_url] = (now + SHORT_LINK_TTL, target)
+            return target
+        print(f"Short link {url} led to unsupported URL: {target.canonical_url}")
+    except Exception as e:
+        print(f"Error resolving short link {url}: {e}")
+
+    # Не удалось раскрыть - тип неизвестен; платформа известна, так что скачивание все равно возможно
+    return ResolvedUrl(resolved.platform, 'unknown', None, resolved.canonical_url)
+
+def download_url(url: str, resolved: ResolvedUrl) -> str:
+    """URL для yt-dlp: канонический (без si, feature, utm_* и т.п.) для конкретного видео
+    и для раскрытой короткой ссылки.
+
+    Для остальных профилей и нераспознанных ссылок канонический вид отбрасывает часть пути
+    (например, вкладку), поэтому отдаем исходный URL.
+    """
+    if resolved.kind == 'video':
+        return resolved.canonical_url
+    if resolved.kind != 'unknown' and _route(url).kind == 'shortlink':
+        return resolved.canonical_url
+    return url
 
 def get_instagram_profile_videos(url: str, limit: int = 3) -> list:
     """Получает список последних Reels из Instagram профиля через парсинг HTML или yt-dlp"""
+    import requests
+    import yt_dlp
+    from bs4 import BeautifulSoup
     # Сначала пробуем yt-dlp (более надежный метод)
     print(f"Trying yt-dlp for Instagram profile: {url}")
     try:
@@ -318,7 +502,8 @@ def get_instagram_profile_videos(url: str, limit: int = 3) -> list:
 
 def get_profile_info(url: str) -> dict:
     """Получает информацию о профиле (bio, description, links)"""
-    platform = detect_platform(url)
+    import yt_dlp
+    platform = resolve_url(url).platform
     
     if platform == 'unknown':
         return {
@@ -405,7 +590,9 @@ def get_profile_info(url: str) -> dict:
 
 def get_profile_videos(url: str, limit: int = 3) -> list:
     """Получает список последних видео из профиля/канала"""
-    platform = detect_platform(url)
+    import yt_dlp
+    resolved = resolve_url(url)
+    platform = resolved.platform
     
     if platform == 'unknown':
         return []
@@ -417,17 +604,11 @@ def get_profile_videos(url: str, limit: int = 3) -> list:
     # Для YouTube с /shorts - используем специальную обработку
     channel_url = url
     filter_shorts = False
-    if platform == 'youtube' and '/shorts' in url.lower():
-        # Для YouTube Shorts плейлиста нужно использовать формат канала
-        # Преобразуем youtube.com/@username/shorts в формат для получения всех видео
-        parsed = urlparse(url)
-        if parsed.path.startswith('/@'):
-            # Извлекаем username (без @)
-            path_parts = parsed.path.split('/')
-            username = path_parts[1]  # @username
-            # Используем формат канала для получения всех видео
-            channel_url = f"https://www.youtube.com/{username}/shorts"
-            filter_shorts = True
+    if (platform == 'youtube' and resolved.kind == 'profile' and
+            resolved.canonical_id.startswith('@') and resolved.canonical_id.endswith('/shorts')):
+        # Для YouTube Shorts плейлиста используем канонический youtube.com/@username/shorts
+        channel_url = resolved.canonical_url
+        filter_shorts = True
     
     ydl_opts = {
         'quiet': True,
@@ -492,6 +673,7 @@ def get_profile_videos(url: str, limit: int = 3) -> list:
 
 def download_video(url: str) -> dict:
     """Скачивает видео используя yt-dlp"""
+    import yt_dlp
     # Создаем уникальное имя файла
     unique_id = str(uuid.uuid4())
     output_path = str(TEMP_DIR / f"{unique_id}.%(ext)s")
@@ -536,7 +718,7 @@ def download_video(url: str) -> dict:
                 'title': info.get('title', ''),
                 'duration': info.get('duration', 0),
                 'thumbnail': info.get('thumbnail', ''),
-                'platform': detect_platform(url),
+                'platform': resolve_url(url).platform,
             }
     except Exception as e:
         # Удаляем файл в случае ошибки
@@ -550,6 +732,275 @@ def download_video(url: str) -> dict:
             'error': str(e)
         }
 
+class HashRing:
+    """Консистентное хеширование ключей видео по узлам кластера"""
+
+    def __init__(self, nodes: list, replicas: int = 100):
+        # Виртуальные узлы сглаживают распределение; при добавлении узла переезжает ~1/N ключей
+        self._ring = sorted((self._hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._hashes = [h for h, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int(hashlib.md5(value.encode('utf-8')).hexdigest()[:16], 16)
+
+    def node_for(self, key: str) -> str:
+        """Возвращает узел-владелец ключа"""
+        idx = bisect.bisect(self._hashes, self._hash(key)) % len(self._ring)
+        return self._ring[idx][1]
+
+class SqliteJobStore:
+    """Общий реестр задач и результатов в SQLite (общий том между узлами или локальные тесты)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with closing(self._connect()) as conn, conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS jobs (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_expires ON jobs (expires)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key: str):
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT value FROM jobs WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                               (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: dict, ttl: int = None):
+        expires = time.time() + ttl if ttl else None
+        with closing(self._connect()) as conn, conn:
+            # Заодно чистим истекшие записи: сами по себе они удаляются только при claim того же ключа
+            conn.execute('DELETE FROM jobs WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+            conn.execute('INSERT OR REPLACE INTO jobs (key, value, expires) VALUES (?, ?, ?)',
+                         (key, json.dumps(value), expires))
+
+    def claim(self, key: str, value: dict, ttl: int) -> bool:
+        """Атомарно записывает значение, только если ключа нет (или он истек)"""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute('DELETE FROM jobs WHERE key = ? AND expires IS NOT NULL AND expires <= ?', (key, now))
+            cursor = conn.execute('INSERT OR IGNORE INTO jobs (key, value, expires) VALUES (?, ?, ?)',
+                                  (key, json.dumps(value), now + ttl))
+            return cursor.rowcount == 1
+
+    def delete(self, key: str):
+        with closing(self._connect()) as conn, conn:
+            conn.execute('DELETE FROM jobs WHERE key = ?', (key,))
+
+class RedisJobStore:
+    """Общий реестр задач и результатов в Redis"""
+
+    def __init__(self, url: str):
+        import redis  # Опциональная зависимость, нужна только для CLUSTER_STORE=redis://...
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        raw = self._redis.get(key)
+        return json.loads(raw) if raw else None
+
+    def set(self, key: str, value: dict, ttl: int = None):
+        self._redis.set(key, json.dumps(value), ex=ttl)
+
+    def claim(self, key: str, value: dict, ttl: int) -> bool:
+        return bool(self._redis.set(key, json.dumps(value), nx=True, ex=ttl))
+
+    def delete(self, key: str):
+        self._redis.delete(key)
+
+def create_job_store(location: str):
+    """Создает хранилище по CLUSTER_STORE: redis://... или путь к SQLite-файлу"""
+    if location.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisJobStore(location)
+    return SqliteJobStore(location)
+
+hash_ring = HashRing(CLUSTER_NODES) if CLUSTER_ENABLED else None
+job_store = create_job_store(CLUSTER_STORE) if CLUSTER_ENABLED else None
+
+def job_key(resolved: ResolvedUrl) -> str:
+    """Ключ задачи в реестре: одно и то же видео по любому варианту URL дает один ключ"""
+    return f"job:{resolved.platform}:{resolved.canonical_id or resolved.canonical_url}"
+
+def purge_expired_artifacts():
+    """Удаляет артефакты старше CLUSTER_RESULT_TTL - реестр о них уже забыл"""
+    expired_before = time.time() - CLUSTER_RESULT_TTL
+    for artifact in ARTIFACT_DIR.glob('*'):
+        try:
+            if artifact.stat().st_mtime < expired_before:
+                artifact.unlink()
+        except OSError:
+            pass
+
+def checkout_artifact(result: dict) -> dict:
+    """Выдает запросу собственную копию артефакта (жесткую ссылку), которую он может удалить сам"""
+    artifact = Path(result['file_path'])
+    private_path = TEMP_DIR / f"{uuid.uuid4()}{artifact.suffix}"
+    try:
+        os.link(artifact, private_path)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        # Файловая система без жестких ссылок
+        shutil.copy2(artifact, private_path)
+    job_store.set(f"file:{private_path.name}", {'node': NODE_URL}, CLUSTER_RESULT_TTL)
+    return dict(result, file_path=str(private_path), filename=private_path.name)
+
+def download_video_once(url: str, resolved: ResolvedUrl) -> dict:
+    """Скачивает видео не более одного раза на кластер: параллельные и повторные запросы получают готовый результат"""
+    key = job_key(resolved)
+    deadline = time.time() + CLUSTER_JOB_TIMEOUT
+
+    while True:
+        job = job_store.get(key)
+        if job is None:
+            if job_store.claim(key, {'status': 'pending', 'node': NODE_URL}, CLUSTER_JOB_TIMEOUT):
+                break
+            continue
+        if job['status'] == 'done':
+            result = job['result']
+            if job['node'] != NODE_URL:
+                # Артефакт на другом узле - его отдаст /download/file
+                return result
+            try:
+                return checkout_artifact(result)
+            except FileNotFoundError:
+                # Артефакт уже удален по сроку - скачиваем заново
+                job_store.delete(key)
+                continue
+        if job['status'] == 'failed':
+            return job['result']
+        if time.time() > deadline:
+            return {
+                'success': False,
+                'error': f"Timed out waiting for download on {job['node']}"
+            }
+        time.sleep(CLUSTER_POLL_INTERVAL)
+
+    result = download_video(download_url(url, resolved))
+    if not result['success']:
+        job_store.set(key, {'status': 'failed', 'node': NODE_URL, 'result': result}, CLUSTER_FAILURE_TTL)
+        return result
+
+    ARTIFACT_DIR.mkdir(exist_ok=True)
+    purge_expired_artifacts()
+    artifact = ARTIFACT_DIR / result['filename']
+    os.replace(result['file_path'], artifact)
+    result = dict(result, file_path=str(artifact), node=NODE_URL)
+    job_store.set(key, {'status': 'done', 'node': NODE_URL, 'result': result}, CLUSTER_RESULT_TTL)
+    job_store.set(f"file:{artifact.name}", {'node': NODE_URL}, CLUSTER_RESULT_TTL)
+    return checkout_artifact(result)
+
+def forwarding_headers() -> dict:
+    """Заголовки запроса к другому узлу кластера"""
+    headers = {FORWARDED_HEADER: NODE_URL}
+    if CLUSTER_SECRET:
+        headers[SECRET_HEADER] = CLUSTER_SECRET
+    return headers
+
+def is_forwarded_request() -> bool:
+    """Пришел ли запрос от другого узла кластера (такие запросы не пересылаются дальше)"""
+    if request.headers.get(FORWARDED_HEADER) not in CLUSTER_NODES:
+        return False
+    return not CLUSTER_SECRET or hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), CLUSTER_SECRET)
+
+def forward_to_node(node: str, path: str, params: dict):
+    """Пересылает запрос узлу-владельцу. Возвращает None, если к узлу не удалось подключиться"""
+    import requests
+    try:
+        # Владелец может ждать задачу до CLUSTER_JOB_TIMEOUT, поэтому ждем его ответа чуть дольше
+        response = requests.get(f"{node}{path}", params=params, headers=forwarding_headers(),
+                                timeout=(5, CLUSTER_JOB_TIMEOUT + 30))
+    except requests.exceptions.ConnectionError as e:
+        print(f"Node {node} is unavailable, handling locally: {e}")
+        return None
+    except requests.exceptions.Timeout as e:
+        print(f"Node {node} did not respond in time: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'Timed out waiting for node {node}'
+        }), 504
+    except requests.exceptions.RequestException as e:
+        print(f"Error forwarding request to node {node}: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'Error forwarding request to node {node}: {e}'
+        }), 502
+    return Response(response.content, status=response.status_code,
+                    content_type=response.headers.get('Content-Type', 'application/json'))
+
+def serve_remote_file(node: str, file_path: str):
+    """Отдает файл, лежащий на другом узле: редиректом или проксированием"""
+    import requests
+    params = {'file_path': file_path}
+    if CLUSTER_FILE_MODE != 'proxy':
+        return redirect(f"{node}/download/file?{urlencode(params)}", code=307)
+
+    try:
+        response = requests.get(f"{node}/download/file", params=params, headers=forwarding_headers(),
+                                stream=True, timeout=(5, 60))
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching file from node {node}: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'File is stored on node {node}, which is unavailable'
+        }), 502
+    if response.status_code != 200:
+        response.close()
+        if response.status_code == 404:
+            return jsonify({
+                'success': False,
+                'error': 'File not found'
+            }), 404
+        return jsonify({
+            'success': False,
+            'error': f'Node {node} returned HTTP {response.status_code}'
+        }), 502
+
+    headers = {name: response.headers[name]
+               for name in ('Content-Type', 'Content-Length', 'Content-Disposition')
+               if name in response.headers}
+    proxied = Response(stream_with_context(response.iter_content(chunk_size=64 * 1024)),
+                       status=response.status_code, headers=headers)
+    proxied.call_on_close(response.close)
+    return proxied
+
+_warm = threading.Event()
+_prewarm_error = None
+
+def prewarm_extractors():
+    """Импортирует тяжелые модули и загружает классы экстракторов YouTube, TikTok и Instagram.
+
+    Запросы по-прежнему создают свой YoutubeDL и экземпляры экстракторов,
+    экономится только однократная загрузка модулей.
+    """
+    global _prewarm_error
+    started = time.perf_counter()
+    try:
+        # Загружаем модули ради побочного эффекта: последующие ленивые импорты в запросах бесплатны
+        for module in PREWARM_MODULES:
+            importlib.import_module(module)
+        import yt_dlp
+        with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
+            for ie_key in PREWARM_IE_KEYS:
+                ydl.get_info_extractor(ie_key)
+        print(f"Extractors pre-warmed in {time.perf_counter() - started:.2f}s")
+        _warm.set()
+    except Exception as e:
+        # Скорее всего сломан yt-dlp: узел остается неготовым, чтобы не принимать заведомо неудачные загрузки
+        _prewarm_error = str(e)
+        print(f"Error pre-warming extractors: {e}")
+
+def is_ready() -> bool:
+    """Готов ли узел принимать трафик: прогрев успешно завершен (или отключен)"""
+    return not PREWARM_EXTRACTORS or _warm.is_set()
+
+# При `python app.py` запускается перезагрузчик Werkzeug (debug=True): родительский процесс только следит
+# за файлами и не обслуживает запросы, поэтому прогреваем лишь дочерний (WERKZEUG_RUN_MAIN=true)
+_is_reloader_parent = __name__ == '__main__' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+
+if PREWARM_EXTRACTORS and not _is_reloader_parent:
+    threading.Thread(target=prewarm_extractors, name='prewarm-extractors', daemon=True).start()
+
 @app.route('/download', methods=['GET'])
 def download():
     """Эндпоинт для скачивания видео"""
@@ -561,26 +1012,39 @@ def download():
             'error': 'Missing "url" query parameter'
         }), 400
     
-    platform = detect_platform(url)
-    if platform == 'unknown':
+    resolved = resolve_url(url)
+    if resolved.platform == 'unknown':
         return jsonify({
             'success': False,
             'error': 'Unsupported platform. Supported: YouTube, TikTok, Instagram'
         }), 400
     
-    result = download_video(url)
+    if CLUSTER_ENABLED:
+        # Каждое видео скачивает только узел-владелец; остальные пересылают ему запрос
+        owner = hash_ring.node_for(job_key(resolved))
+        if owner != NODE_URL and not is_forwarded_request():
+            # Владелец получает уже раскрытый URL и не повторяет запросы к коротким ссылкам
+            forwarded = forward_to_node(owner, '/download', {'url': download_url(url, resolved)})
+            if forwarded is not None:
+                return forwarded
+        result = download_video_once(url, resolved)
+    else:
+        result = download_video(download_url(url, resolved))
     
     if result['success']:
+        data = {
+            'file_path': result['file_path'],
+            'filename': result['filename'],
+            'title': result['title'],
+            'duration': result['duration'],
+            'thumbnail': result['thumbnail'],
+            'platform': result['platform'],
+        }
+        if CLUSTER_ENABLED:
+            data['node'] = result['node']  # Узел, на котором лежит файл
         return jsonify({
             'success': True,
-            'data': {
-                'file_path': result['file_path'],
-                'filename': result['filename'],
-                'title': result['title'],
-                'duration': result['duration'],
-                'thumbnail': result['thumbnail'],
-                'platform': result['platform'],
-            }
+            'data': data
         })
     else:
         return jsonify({
@@ -600,6 +1064,11 @@ def download_file():
         }), 400
     
     if not os.path.exists(file_path):
+        # В многоузловом режиме файл может лежать на другом узле
+        if CLUSTER_ENABLED and not is_forwarded_request():
+            artifact = job_store.get(f"file:{os.path.basename(file_path)}")
+            if artifact and artifact['node'] != NODE_URL:
+                return serve_remote_file(artifact['node'], file_path)
         return jsonify({
             'success': False,
             'error': 'File not found'
@@ -647,14 +1116,15 @@ def get_profile_videos_endpoint():
             'error': 'Missing "url" query parameter'
         }), 400
     
-    platform = detect_platform(url)
+    resolved = resolve_url(url)
+    platform = resolved.platform
     if platform == 'unknown':
         return jsonify({
             'success': False,
             'error': 'Unsupported platform. Supported: YouTube, TikTok, Instagram'
         }), 400
     
-    if not is_profile_url(url):
+    if resolved.kind not in ('profile', 'playlist'):
         return jsonify({
             'success': False,
             'error': 'URL is not a profile/channel link. Please provide a profile URL, not a video URL.'
@@ -699,11 +1169,37 @@ def get_profile_videos_endpoint():
 
 @app.route('/health', methods=['GET'])
 def health():
-    """Health check эндпоинт"""
-    return jsonify({
+    """Health check эндпоинт: live - процесс отвечает, ready - экстракторы прогреты"""
+    response = {
         'status': 'ok',
-        'service': 'video-downloader'
-    })
+        'service': 'video-downloader',
+        'live': True,
+        'ready': is_ready(),
+        'warm': _warm.is_set(),
+    }
+    if _prewarm_error:
+        response['prewarm_error'] = _prewarm_error
+    if CLUSTER_ENABLED:
+        response['node'] = NODE_URL
+        response['cluster_nodes'] = CLUSTER_NODES
+    return jsonify(response)
+
+@app.route('/health/live', methods=['GET'])
+def health_live():
+    """Liveness probe: процесс жив и обрабатывает запросы"""
+    return jsonify({'live': True})
+
+@app.route('/health/ready', methods=['GET'])
+def health_ready():
+    """Readiness probe: 503, пока идет прогрев экстракторов или если он не удался"""
+    ready = is_ready()
+    response = {
+        'ready': ready,
+        'warm': _warm.is_set(),
+    }
+    if _prewarm_error:
+        response['prewarm_error'] = _prewarm_error
+    return jsonify(response), 200 if ready else 503
 
 if __name__ == '__main__':
     import sys
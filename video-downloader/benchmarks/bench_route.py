@@ -0,0 +1,37 @@
+"""Микро-бенчмарк разбора URL: python benchmarks/bench_route.py
+
+Меряет _route без кэша (холодный разбор) и с LRU-кэшем (повторный URL). Сеть не используется.
+"""
+import os
+import sys
+import timeit
+from pathlib import Path
+
+os.environ.setdefault('PREWARM_EXTRACTORS', '0')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app  # noqa: E402
+
+URLS = [
+    'https://youtu.be/dQw4w9WgXcQ?si=AbCdEf123',
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ&si=AbCdEf123',
+    'https://www.youtube.com/shorts/dQw4w9WgXcQ',
+    'https://www.youtube.com/@MrBeast/shorts',
+    'https://www.tiktok.com/@khaby.lame/video/7123456789012345678?is_from_webapp=1',
+    'https://www.tiktok.com/@khaby.lame',
+    'https://www.instagram.com/reel/C1a2B3c4D5e/?igsh=MWQ1ZGUxMzBkMA==',
+    'https://www.instagram.com/natgeo/',
+    'https://example.com/video',
+]
+NUMBER = 20000
+
+
+def bench(name, func):
+    best = min(timeit.repeat(lambda: [func(url) for url in URLS], number=NUMBER // len(URLS), repeat=5))
+    print(f"{name}: {best / NUMBER * 1e6:.2f} us/url")
+
+
+if __name__ == '__main__':
+    bench('_route, uncached', app._route.__wrapped__)
+    app._route.cache_clear()
+    bench('_route, LRU hit', app._route)
@@ -0,0 +1,93 @@
+"""Бенчмарк холодного старта: python benchmarks/bench_startup.py [--app-dir DIR] [--runs N]
+
+Каждый замер - отдельный процесс Python:
+- import app (по -X importtime, cumulative) и время импорта по часам;
+- первый успешный /health через тестовый клиент Flask;
+- готовность экстракторов YouTube, TikTok и Instagram - то, что первый реальный запрос
+  оплачивает до сетевых обращений (без прогрева, PREWARM_EXTRACTORS=0);
+- с прогревом: первый /health/live и первый 200 от /health/ready.
+
+Для сравнения с версией до ленивых импортов:
+    git worktree add /tmp/before <commit> && python benchmarks/bench_startup.py --app-dir /tmp/before/video-downloader
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+LAZY = r'''
+import time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+assert app.app.test_client().get('/health').status_code == 200
+t2 = time.perf_counter()
+import yt_dlp
+with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
+    for ie_key in ('Youtube', 'TikTok', 'Instagram'):
+        ydl.get_info_extractor(ie_key)
+t3 = time.perf_counter()
+print('RESULT', (t1 - t0) * 1000, (t2 - t0) * 1000, (t3 - t0) * 1000)
+'''
+
+PREWARM = r'''
+import time
+t0 = time.perf_counter()
+import app
+client = app.app.test_client()
+assert client.get('/health/live').status_code == 200
+t1 = time.perf_counter()
+while client.get('/health/ready').status_code != 200:
+    time.sleep(0.005)
+t2 = time.perf_counter()
+print('RESULT', (t1 - t0) * 1000, (t2 - t0) * 1000)
+'''
+
+
+def run(code, app_dir, prewarm, extra_args=()):
+    env = dict(os.environ, PREWARM_EXTRACTORS='1' if prewarm else '0')
+    env.pop('CLUSTER_NODES', None)
+    result = subprocess.run([sys.executable, *extra_args, '-c', code], cwd=app_dir, env=env,
+                            capture_output=True, text=True, check=True)
+    return result
+
+
+def measure(code, app_dir, prewarm, runs):
+    rows = []
+    for _ in range(runs):
+        output = run(code, app_dir, prewarm).stdout
+        values = re.search(r'RESULT((?: [\d.]+)+)', output).group(1)
+        rows.append([float(value) for value in values.split()])
+    return [statistics.median(column) for column in zip(*rows)]
+
+
+def import_time(app_dir, runs):
+    samples = []
+    for _ in range(runs):
+        stderr = run('import app', app_dir, False, ('-X', 'importtime')).stderr
+        line = next(line for line in reversed(stderr.splitlines()) if line.rstrip().endswith('| app'))
+        samples.append(int(line.split('|')[1]) / 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--app-dir', default=str(Path(__file__).resolve().parent.parent))
+    parser.add_argument('--runs', type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"python -X importtime, import app (cumulative): {import_time(args.app_dir, args.runs):.0f} ms")
+    imported, health, extractors = measure(LAZY, args.app_dir, False, args.runs)
+    print(f"without pre-warm: import app {imported:.0f} ms, first /health {health:.0f} ms, "
+          f"extractors ready {extractors:.0f} ms")
+    if (Path(args.app_dir) / 'app.py').read_text(encoding='utf-8').find("'/health/ready'") != -1:
+        live, ready = measure(PREWARM, args.app_dir, True, args.runs)
+        print(f"with pre-warm: first /health/live {live:.0f} ms, /health/ready 200 {ready:.0f} ms")
+    print(f"median of {args.runs} runs")
+
+
+if __name__ == '__main__':
+    main()
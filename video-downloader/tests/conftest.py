@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+# Тесты не должны запускать фоновый прогрев yt-dlp и многоузловой режим из окружения
+os.environ['PREWARM_EXTRACTORS'] = '0'
+os.environ.pop('CLUSTER_NODES', None)
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
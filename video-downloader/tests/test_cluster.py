@@ -0,0 +1,284 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import pytest
+import requests
+
+import app
+
+NODE_A = 'http://dl-a:5000'
+NODE_B = 'http://dl-b:5000'
+VIDEO_URL = 'https://youtu.be/dQw4w9WgXcQ?si=abc'
+
+
+@pytest.fixture
+def store(tmp_path):
+    return app.SqliteJobStore(str(tmp_path / 'cluster.sqlite3'))
+
+
+@pytest.fixture
+def cluster(monkeypatch, store, tmp_path):
+    """Включает многоузловой режим для узла A с общим SQLite-реестром"""
+    monkeypatch.setattr(app, 'TEMP_DIR', tmp_path)
+    monkeypatch.setattr(app, 'ARTIFACT_DIR', tmp_path / 'artifacts')
+    monkeypatch.setattr(app, 'CLUSTER_ENABLED', True)
+    monkeypatch.setattr(app, 'CLUSTER_NODES', [NODE_A, NODE_B])
+    monkeypatch.setattr(app, 'NODE_URL', NODE_A)
+    monkeypatch.setattr(app, 'CLUSTER_SECRET', '')
+    monkeypatch.setattr(app, 'CLUSTER_POLL_INTERVAL', 0.01)
+    monkeypatch.setattr(app, 'hash_ring', app.HashRing([NODE_A, NODE_B]))
+    monkeypatch.setattr(app, 'job_store', store)
+    return store
+
+
+def fake_download(tmp_path, calls, delay=0.0, success=True):
+    def download(url):
+        calls.append(url)
+        time.sleep(delay)
+        if not success:
+            return {'success': False, 'error': 'boom'}
+        path = tmp_path / f'{len(calls)}.mp4'
+        path.write_bytes(b'video')
+        return {
+            'success': True,
+            'file_path': str(path),
+            'filename': path.name,
+            'title': 'Title',
+            'duration': 1,
+            'thumbnail': '',
+            'platform': 'youtube',
+        }
+    return download
+
+
+def test_hash_ring_is_deterministic_and_balanced():
+    nodes = [f'http://dl-{i}:5000' for i in range(4)]
+    ring = app.HashRing(nodes)
+    assert ring.node_for('job:youtube:abc') == app.HashRing(list(reversed(nodes))).node_for('job:youtube:abc')
+
+    counts = Counter(ring.node_for(f'job:youtube:{i}') for i in range(20000))
+    assert set(counts) == set(nodes)
+    assert all(0.15 < count / 20000 < 0.35 for count in counts.values())
+
+
+def test_hash_ring_moves_only_keys_of_new_node():
+    nodes = [f'http://dl-{i}:5000' for i in range(4)]
+    before, after = app.HashRing(nodes), app.HashRing(nodes + ['http://dl-4:5000'])
+    moved = [key for key in (f'k{i}' for i in range(20000)) if before.node_for(key) != after.node_for(key)]
+    assert 0.1 < len(moved) / 20000 < 0.3
+    assert {after.node_for(key) for key in moved} == {'http://dl-4:5000'}
+
+
+def test_sqlite_claim_is_exclusive(store):
+    wins = []
+    threads = [threading.Thread(target=lambda: wins.append(store.claim('job', {'status': 'pending'}, 30)))
+               for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert wins.count(True) == 1
+    assert store.get('job') == {'status': 'pending'}
+
+
+def test_sqlite_expired_claim_can_be_taken_over(store):
+    store.set('job', {'status': 'pending', 'node': NODE_B}, ttl=1)
+    assert not store.claim('job', {'status': 'pending', 'node': NODE_A}, 30)
+    time.sleep(1.1)
+    assert store.get('job') is None
+    assert store.claim('job', {'status': 'pending', 'node': NODE_A}, 30)
+    store.delete('job')
+    assert store.get('job') is None
+
+
+def test_concurrent_requests_download_once(cluster, monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(app, 'download_video', fake_download(tmp_path, calls, delay=0.2))
+    resolved = app.resolve_url(VIDEO_URL)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(app.download_video_once(VIDEO_URL, resolved)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ['https://www.youtube.com/watch?v=dQw4w9WgXcQ']
+    # Каждый запрос получает свой файл: потребитель удаляет его после обработки
+    assert len({result['file_path'] for result in results}) == 4
+    assert all(os.path.exists(result['file_path']) for result in results)
+    assert all(result['node'] == NODE_A for result in results)
+    assert all(cluster.get(f"file:{result['filename']}") == {'node': NODE_A} for result in results)
+
+
+def test_consumer_deleting_its_file_does_not_affect_others(cluster, monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(app, 'download_video', fake_download(tmp_path, calls))
+    resolved = app.resolve_url(VIDEO_URL)
+    first = app.download_video_once(VIDEO_URL, resolved)
+    second = app.download_video_once(VIDEO_URL, resolved)
+    os.remove(first['file_path'])
+    with open(second['file_path'], 'rb') as video:
+        assert video.read() == b'video'
+    third = app.download_video_once(VIDEO_URL, resolved)
+    assert os.path.exists(third['file_path'])
+    assert len(calls) == 1
+
+
+def test_failed_download_is_shared_briefly(cluster, monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(app, 'download_video', fake_download(tmp_path, calls, success=False))
+    resolved = app.resolve_url(VIDEO_URL)
+    assert app.download_video_once(VIDEO_URL, resolved) == {'success': False, 'error': 'boom'}
+    assert app.download_video_once(VIDEO_URL, resolved) == {'success': False, 'error': 'boom'}
+    assert len(calls) == 1
+
+
+def test_expired_artifact_is_downloaded_again(cluster, monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(app, 'download_video', fake_download(tmp_path, calls))
+    resolved = app.resolve_url(VIDEO_URL)
+    app.download_video_once(VIDEO_URL, resolved)
+    for artifact in app.ARTIFACT_DIR.iterdir():
+        artifact.unlink()
+    second = app.download_video_once(VIDEO_URL, resolved)
+    assert len(calls) == 2
+    assert os.path.exists(second['file_path'])
+
+
+def test_old_artifacts_are_purged(cluster, monkeypatch):
+    app.ARTIFACT_DIR.mkdir()
+    old, fresh = app.ARTIFACT_DIR / 'old.mp4', app.ARTIFACT_DIR / 'fresh.mp4'
+    old.write_bytes(b'')
+    fresh.write_bytes(b'')
+    os.utime(old, (time.time() - app.CLUSTER_RESULT_TTL - 60,) * 2)
+    app.purge_expired_artifacts()
+    assert not old.exists()
+    assert fresh.exists()
+
+
+def test_sqlite_set_purges_expired_rows(store):
+    store.set('file:old.mp4', {'node': NODE_A}, ttl=1)
+    store.set('job:keep', {'status': 'done'})
+    time.sleep(1.1)
+    store.set('file:new.mp4', {'node': NODE_A}, ttl=60)
+    with app.closing(store._connect()) as conn:
+        keys = {row[0] for row in conn.execute('SELECT key FROM jobs')}
+    assert keys == {'job:keep', 'file:new.mp4'}
+
+
+@pytest.fixture
+def owned_by_b(cluster, monkeypatch):
+    monkeypatch.setattr(app, 'hash_ring', app.HashRing([NODE_B]))
+    forwarded = []
+
+    def forward(node, path, params):
+        forwarded.append((node, path, params))
+        return app.jsonify({'success': True, 'data': {'node': node}})
+
+    monkeypatch.setattr(app, 'forward_to_node', forward)
+    monkeypatch.setattr(app, 'download_video_once',
+                        lambda url, resolved: {'success': False, 'error': 'handled locally'})
+    return forwarded
+
+
+def test_download_is_forwarded_to_owner(owned_by_b):
+    response = app.app.test_client().get('/download', query_string={'url': VIDEO_URL})
+    assert response.json['data']['node'] == NODE_B
+    assert owned_by_b == [(NODE_B, '/download', {'url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'})]
+
+
+def test_expanded_short_link_is_forwarded(owned_by_b, monkeypatch):
+    monkeypatch.setattr(app, 'resolve_url', lambda url: app.ResolvedUrl(
+        'tiktok', 'profile', '@khaby.lame', 'https://www.tiktok.com/@khaby.lame'))
+    app.app.test_client().get('/download', query_string={'url': 'https://vm.tiktok.com/ZMabc123/'})
+    assert owned_by_b[0][2] == {'url': 'https://www.tiktok.com/@khaby.lame'}
+
+
+def test_forwarded_request_is_handled_locally(owned_by_b):
+    response = app.app.test_client().get('/download', query_string={'url': VIDEO_URL},
+                                         headers={app.FORWARDED_HEADER: NODE_B})
+    assert response.json['error'] == 'handled locally'
+    assert owned_by_b == []
+
+
+def test_forwarded_header_from_unknown_node_is_ignored(owned_by_b):
+    app.app.test_client().get('/download', query_string={'url': VIDEO_URL},
+                              headers={app.FORWARDED_HEADER: 'http://attacker'})
+    assert len(owned_by_b) == 1
+
+
+def test_forwarded_header_requires_cluster_secret(owned_by_b, monkeypatch):
+    monkeypatch.setattr(app, 'CLUSTER_SECRET', 's3cret')
+    client = app.app.test_client()
+    client.get('/download', query_string={'url': VIDEO_URL}, headers={app.FORWARDED_HEADER: NODE_B})
+    assert len(owned_by_b) == 1
+    client.get('/download', query_string={'url': VIDEO_URL},
+               headers={app.FORWARDED_HEADER: NODE_B, app.SECRET_HEADER: 's3cret'})
+    assert len(owned_by_b) == 1
+
+
+def raise_(error):
+    def get(*args, **kwargs):
+        raise error
+    return get
+
+
+def test_forward_falls_back_only_on_connection_error(cluster, monkeypatch):
+    with app.app.test_request_context():
+        monkeypatch.setattr(requests, 'get', raise_(requests.exceptions.ConnectionError('refused')))
+        assert app.forward_to_node(NODE_B, '/download', {'url': VIDEO_URL}) is None
+
+        monkeypatch.setattr(requests, 'get', raise_(requests.exceptions.ReadTimeout('slow')))
+        response, status = app.forward_to_node(NODE_B, '/download', {'url': VIDEO_URL})
+        assert status == 504
+        assert response.json['success'] is False
+
+
+def test_proxied_file_from_unavailable_node(cluster, monkeypatch):
+    monkeypatch.setattr(app, 'CLUSTER_FILE_MODE', 'proxy')
+    monkeypatch.setattr(requests, 'get', raise_(requests.exceptions.ConnectTimeout('down')))
+    cluster.set('file:missing.mp4', {'node': NODE_B})
+    response = app.app.test_client().get('/download/file', query_string={'file_path': '/nowhere/missing.mp4'})
+    assert response.status_code == 502
+    assert response.json['success'] is False
+
+
+def test_proxied_file_missing_on_owner(cluster, monkeypatch):
+    class Upstream:
+        status_code = 404
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    upstream = Upstream()
+    monkeypatch.setattr(app, 'CLUSTER_FILE_MODE', 'proxy')
+    monkeypatch.setattr(requests, 'get', lambda *args, **kwargs: upstream)
+    cluster.set('file:missing.mp4', {'node': NODE_B})
+    response = app.app.test_client().get('/download/file', query_string={'file_path': '/nowhere/missing.mp4'})
+    assert response.status_code == 404
+    assert response.json == {'success': False, 'error': 'File not found'}
+    assert upstream.closed
+
+
+def test_remote_file_is_redirected_to_owner(cluster, monkeypatch):
+    monkeypatch.setattr(app, 'CLUSTER_FILE_MODE', 'redirect')
+    cluster.set('file:missing.mp4', {'node': NODE_B})
+    response = app.app.test_client().get('/download/file', query_string={'file_path': '/nowhere/missing.mp4'})
+    assert response.status_code == 307
+    assert response.headers['Location'].startswith(f'{NODE_B}/download/file?')
+
+
+def test_cluster_requires_shared_store():
+    env = dict(os.environ, CLUSTER_NODES=NODE_A, NODE_URL=NODE_A, PREWARM_EXTRACTORS='0')
+    env.pop('CLUSTER_STORE', None)
+    result = subprocess.run([sys.executable, '-c', 'import app'], env=env, capture_output=True, text=True,
+                            cwd=Path(app.__file__).parent)
+    assert result.returncode != 0
+    assert 'CLUSTER_STORE must be set' in result.stderr
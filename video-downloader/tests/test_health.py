@@ -0,0 +1,51 @@
+import sys
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def prewarm(monkeypatch):
+    """Включает прогрев, но не запускает фоновый поток: prewarm_extractors вызывается в тесте"""
+    monkeypatch.setattr(app, 'PREWARM_EXTRACTORS', True)
+    monkeypatch.setattr(app, '_prewarm_error', None)
+    app._warm.clear()
+    yield
+    app._warm.clear()
+
+
+def test_not_ready_while_warming(prewarm):
+    client = app.app.test_client()
+    assert client.get('/health/live').status_code == 200
+    assert client.get('/health/ready').status_code == 503
+    assert client.get('/health').json['ready'] is False
+
+
+def test_ready_after_successful_prewarm(prewarm):
+    pytest.importorskip('yt_dlp')
+    app.prewarm_extractors()
+    response = app.app.test_client().get('/health/ready')
+    assert response.status_code == 200
+    assert response.json == {'ready': True, 'warm': True}
+
+
+def test_failed_prewarm_keeps_node_unready(prewarm, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'yt_dlp', None)
+    app.prewarm_extractors()
+    client = app.app.test_client()
+    response = client.get('/health/ready')
+    assert response.status_code == 503
+    assert response.json['warm'] is False
+    assert 'yt_dlp' in response.json['prewarm_error']
+    health = client.get('/health')
+    assert health.status_code == 200
+    assert health.json['live'] is True
+    assert health.json['ready'] is False
+
+
+def test_ready_without_prewarm(monkeypatch):
+    monkeypatch.setattr(app, 'PREWARM_EXTRACTORS', False)
+    response = app.app.test_client().get('/health/ready')
+    assert response.status_code == 200
+    assert response.json['warm'] is False
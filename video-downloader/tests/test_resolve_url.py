@@ -0,0 +1,184 @@
+import pytest
+
+import app
+from app import ResolvedUrl
+
+VIDEO_ID = 'dQw4w9WgXcQ'
+WATCH_URL = f'https://www.youtube.com/watch?v={VIDEO_ID}'
+
+# Золотой корпус: реальные варианты URL -> (platform, kind, canonical_id, canonical_url)
+GOLDEN = [
+    # YouTube: одно и то же видео в разных обертках
+    (f'https://youtu.be/{VIDEO_ID}?si=AbCdEf123', ('youtube', 'video', VIDEO_ID, WATCH_URL)),
+    (f'youtu.be/{VIDEO_ID}', ('youtube', 'video', VIDEO_ID, WATCH_URL)),
+    (f'https://www.youtube.com/watch?v={VIDEO_ID}&si=AbCdEf123', ('youtube', 'video', VIDEO_ID, WATCH_URL)),
+    (f'https://www.youtube.com/watch?v={VIDEO_ID}&list=PLx&index=2&t=42s', ('youtube', 'video', VIDEO_ID, WATCH_URL)),
+    (f'https://www.youtube.com/shorts/{VIDEO_ID}', ('youtube', 'video', VIDEO_ID, WATCH_URL)),
+    (f'https://www.youtube.com/shorts/{VIDEO_ID}?feature=share', ('youtube', 'video', VIDEO_ID, WATCH_URL)),
+    (f'https://www.youtube.com/@MrBeast/shorts/{VIDEO_ID}', ('youtube', 'video', VIDEO_ID, WATCH_URL)),
+    (f'https://www.youtube.com/live/{VIDEO_ID}?si=x', ('youtube', 'video', VIDEO_ID, WATCH_URL)),
+    (f'https://www.youtube.com/embed/{VIDEO_ID}', ('youtube', 'video', VIDEO_ID, WATCH_URL)),
+    (f'https://www.youtube-nocookie.com/embed/{VIDEO_ID}', ('youtube', 'video', VIDEO_ID, WATCH_URL)),
+    (f'https://m.youtube.com/watch?v={VIDEO_ID}', ('youtube', 'video', VIDEO_ID, WATCH_URL)),
+    (f'https://m.youtube.com/shorts/{VIDEO_ID}', ('youtube', 'video', VIDEO_ID, WATCH_URL)),
+    (f'https://music.youtube.com/watch?v={VIDEO_ID}&feature=share', ('youtube', 'video', VIDEO_ID, WATCH_URL)),
+    (f'YOUTUBE.com/WATCH?v={VIDEO_ID}', ('youtube', 'video', VIDEO_ID, WATCH_URL)),
+    # YouTube: каналы и плейлисты
+    ('https://www.youtube.com/@MrBeast', ('youtube', 'profile', '@mrbeast', 'https://www.youtube.com/@mrbeast')),
+    ('https://www.youtube.com/@MrBeast/', ('youtube', 'profile', '@mrbeast', 'https://www.youtube.com/@mrbeast')),
+    ('https://www.youtube.com/@MrBeast/videos', ('youtube', 'profile', '@mrbeast', 'https://www.youtube.com/@mrbeast')),
+    ('https://www.youtube.com/@MrBeast/shorts',
+     ('youtube', 'profile', '@mrbeast/shorts', 'https://www.youtube.com/@mrbeast/shorts')),
+    ('https://m.youtube.com/@MrBeast/shorts/',
+     ('youtube', 'profile', '@mrbeast/shorts', 'https://www.youtube.com/@mrbeast/shorts')),
+    ('https://www.youtube.com/channel/UCX6OQ3DkcsbYNE6H8uQQuVA',
+     ('youtube', 'profile', 'channel/UCX6OQ3DkcsbYNE6H8uQQuVA',
+      'https://www.youtube.com/channel/UCX6OQ3DkcsbYNE6H8uQQuVA')),
+    ('https://www.youtube.com/@MrBeast/streams', ('youtube', 'profile', '@mrbeast', 'https://www.youtube.com/@mrbeast')),
+    ('https://www.youtube.com/c/MrBeast6000/videos',
+     ('youtube', 'profile', 'c/MrBeast6000', 'https://www.youtube.com/c/MrBeast6000')),
+    ('https://www.youtube.com/user/PewDiePie',
+     ('youtube', 'profile', 'user/PewDiePie', 'https://www.youtube.com/user/PewDiePie')),
+    ('https://www.youtube.com/playlist?list=PLrAXtmErZgOeiKm4sgNOknGvNjby9efdf&si=x',
+     ('youtube', 'playlist', 'PLrAXtmErZgOeiKm4sgNOknGvNjby9efdf',
+      'https://www.youtube.com/playlist?list=PLrAXtmErZgOeiKm4sgNOknGvNjby9efdf')),
+    # TikTok
+    ('https://www.tiktok.com/@khaby.lame/video/7123456789012345678?is_from_webapp=1&sender_device=pc',
+     ('tiktok', 'video', '7123456789012345678', 'https://www.tiktok.com/@khaby.lame/video/7123456789012345678')),
+    ('https://www.tiktok.com/@Khaby.Lame/video/7123456789012345678',
+     ('tiktok', 'video', '7123456789012345678', 'https://www.tiktok.com/@khaby.lame/video/7123456789012345678')),
+    ('https://m.tiktok.com/v/7123456789012345678.html',
+     ('tiktok', 'video', '7123456789012345678', 'https://www.tiktok.com/@/video/7123456789012345678')),
+    ('https://www.tiktok.com/@khaby.lame/photo/7123456789012345678?lang=en',
+     ('tiktok', 'video', '7123456789012345678', 'https://www.tiktok.com/@khaby.lame/photo/7123456789012345678')),
+    ('https://www.tiktok.com/@khaby.lame', ('tiktok', 'profile', '@khaby.lame', 'https://www.tiktok.com/@khaby.lame')),
+    ('https://www.tiktok.com/@khaby.lame?lang=en',
+     ('tiktok', 'profile', '@khaby.lame', 'https://www.tiktok.com/@khaby.lame')),
+    # Instagram
+    ('https://www.instagram.com/reel/C1a2B3c4D5e/?igsh=MWQ1ZGUxMzBkMA==',
+     ('instagram', 'video', 'C1a2B3c4D5e', 'https://www.instagram.com/p/C1a2B3c4D5e/')),
+    ('https://www.instagram.com/reels/C1a2B3c4D5e/',
+     ('instagram', 'video', 'C1a2B3c4D5e', 'https://www.instagram.com/p/C1a2B3c4D5e/')),
+    ('https://instagram.com/p/C1a2B3c4D5e/?igsh=MWQ1ZGUxMzBkMA==',
+     ('instagram', 'video', 'C1a2B3c4D5e', 'https://www.instagram.com/p/C1a2B3c4D5e/')),
+    ('https://www.instagram.com/natgeo/reel/C1a2B3c4D5e/',
+     ('instagram', 'video', 'C1a2B3c4D5e', 'https://www.instagram.com/p/C1a2B3c4D5e/')),
+    ('https://www.instagram.com/natgeo/', ('instagram', 'profile', 'natgeo', 'https://www.instagram.com/natgeo/')),
+    ('https://www.instagram.com/NatGeo?igsh=abc',
+     ('instagram', 'profile', 'natgeo', 'https://www.instagram.com/natgeo/')),
+    ('https://www.instagram.com/natgeo/reels/', ('instagram', 'profile', 'natgeo', 'https://www.instagram.com/natgeo/')),
+]
+
+# Короткие ссылки: без сети их можно только опознать
+SHORT_LINKS = [
+    ('https://vm.tiktok.com/ZMabc123/', 'tiktok', 'vm.tiktok.com/ZMabc123'),
+    ('https://vt.tiktok.com/ZSabc123/', 'tiktok', 'vt.tiktok.com/ZSabc123'),
+    ('https://www.tiktok.com/t/ZTabc123/', 'tiktok', 'www.tiktok.com/t/ZTabc123'),
+    ('https://www.instagram.com/share/reel/BAabc123/', 'instagram', 'www.instagram.com/share/reel/BAabc123'),
+    ('https://www.instagram.com/share/BAabc123', 'instagram', 'www.instagram.com/share/BAabc123'),
+]
+
+UNKNOWN = [
+    ('https://example.com/watch?v=dQw4w9WgXcQ', 'unknown'),
+    ('https://example.com/youtube.com/watch', 'unknown'),
+    ('https://notyoutube.com/watch?v=dQw4w9WgXcQ', 'unknown'),
+    ('https://www.youtube.com/watch?v=short', 'youtube'),
+    ('https://www.youtube.com/playlist', 'youtube'),
+    # Прямые эфиры и служебные вкладки - не списки видео профиля
+    ('https://www.youtube.com/@MrBeast/live', 'youtube'),
+    ('https://www.youtube.com/@MrBeast/about', 'youtube'),
+    ('https://www.youtube.com/channel/UCX6OQ3DkcsbYNE6H8uQQuVA/live', 'youtube'),
+    ('https://www.tiktok.com/@khaby.lame/live', 'tiktok'),
+    ('https://www.instagram.com/explore/', 'instagram'),
+    ('https://www.instagram.com/explore/reels/', 'instagram'),
+    ('https://www.instagram.com/stories/natgeo/3123456789/', 'instagram'),
+]
+
+
+@pytest.mark.parametrize('url, expected', GOLDEN)
+def test_golden_corpus(url, expected):
+    assert tuple(app._route(url)) == expected
+
+
+@pytest.mark.parametrize('url, platform, short_id', SHORT_LINKS)
+def test_short_links_are_detected(url, platform, short_id):
+    assert app._route(url) == ResolvedUrl(platform, 'shortlink', short_id, url)
+
+
+@pytest.mark.parametrize('url, platform', UNKNOWN)
+def test_unrecognized_urls(url, platform):
+    resolved = app._route(url)
+    assert resolved.platform == platform
+    assert resolved.kind == 'unknown'
+    assert resolved.canonical_id is None
+
+
+def test_video_variants_share_one_key():
+    variants = [url for url, expected in GOLDEN if expected[2] == VIDEO_ID]
+    assert len({(app._route(url).platform, app._route(url).canonical_id) for url in variants}) == 1
+
+
+@pytest.fixture
+def short_link_cache():
+    app._short_links.clear()
+    yield app._short_links
+    app._short_links.clear()
+
+
+def test_resolve_url_expands_and_caches_short_link(monkeypatch, short_link_cache):
+    calls = []
+
+    def follow(url):
+        calls.append(url)
+        return 'https://www.tiktok.com/@khaby.lame/video/7123456789012345678?_r=1'
+
+    monkeypatch.setattr(app, '_follow_short_link', follow)
+    expected = ('tiktok', 'video', '7123456789012345678', 'https://www.tiktok.com/@khaby.lame/video/7123456789012345678')
+    assert tuple(app.resolve_url('https://vm.tiktok.com/ZMabc123/')) == expected
+    assert tuple(app.resolve_url('https://vm.tiktok.com/ZMabc123/')) == expected
+    assert len(calls) == 1
+
+
+def test_resolve_url_short_link_cache_expires(monkeypatch, short_link_cache):
+    calls = []
+    monkeypatch.setattr(app, 'SHORT_LINK_TTL', -1)
+    monkeypatch.setattr(app, '_follow_short_link',
+                        lambda url: calls.append(url) or 'https://www.tiktok.com/@khaby.lame')
+    app.resolve_url('https://vm.tiktok.com/ZMabc123/')
+    app.resolve_url('https://vm.tiktok.com/ZMabc123/')
+    assert len(calls) == 2
+
+
+def test_resolve_url_does_not_cache_failures(monkeypatch, short_link_cache):
+    def fail(url):
+        raise OSError('HEAD and GET failed')
+
+    monkeypatch.setattr(app, '_follow_short_link', fail)
+    failed = app.resolve_url('https://vm.tiktok.com/ZMabc123/')
+    assert failed == ResolvedUrl('tiktok', 'unknown', None, 'https://vm.tiktok.com/ZMabc123/')
+
+    monkeypatch.setattr(app, '_follow_short_link', lambda url: 'https://www.tiktok.com/@khaby.lame')
+    resolved = app.resolve_url('https://vm.tiktok.com/ZMabc123/')
+    assert resolved == ResolvedUrl('tiktok', 'profile', '@khaby.lame', 'https://www.tiktok.com/@khaby.lame')
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://www.youtube.com/watch?v=dQw4w9WgXcQ&si=x', 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'),
+    ('https://www.youtube.com/@MrBeast/live', 'https://www.youtube.com/@MrBeast/live'),
+    ('https://www.tiktok.com/@someuser/live', 'https://www.tiktok.com/@someuser/live'),
+    ('https://www.youtube.com/@MrBeast/videos', 'https://www.youtube.com/@MrBeast/videos'),
+])
+def test_download_url_keeps_original_unless_video(url, expected):
+    assert app.download_url(url, app.resolve_url(url)) == expected
+
+
+@pytest.mark.parametrize('url, ie_key', [
+    ('https://m.tiktok.com/v/7123456789012345678.html', 'TikTok'),
+    ('https://www.tiktok.com/@khaby.lame/video/7123456789012345678', 'TikTok'),
+    (f'https://youtu.be/{VIDEO_ID}?si=x', 'Youtube'),
+    ('https://www.instagram.com/reel/C1a2B3c4D5e/', 'Instagram'),
+])
+def test_canonical_video_urls_match_platform_extractor(url, ie_key):
+    extractor = pytest.importorskip('yt_dlp.extractor')
+    canonical_url = app._route(url).canonical_url
+    assert next(ie.ie_key() for ie in extractor.gen_extractor_classes() if ie.suitable(canonical_url)) == ie_key